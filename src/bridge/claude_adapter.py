@@ -1,21 +1,47 @@
+import fcntl
+import heapq
 import logging
 import os
-import select
+import queue
+import selectors
 import subprocess
 import threading
 import time
+from concurrent.futures import Future
+from concurrent.futures import TimeoutError as FutureTimeoutError
 from dataclasses import dataclass, field
-from typing import Dict, List, Optional
+from typing import Dict, List, Optional, Tuple
 
 
 LOGGER = logging.getLogger(__name__)
 
+# Pipe reads are drained in large slabs so one readiness wakeup costs as few
+# read() syscalls as possible; 64 KiB matches the default pipe buffer ceiling.
+READ_CHUNK_SIZE = 65536
+
+# Session bookkeeping is striped across this many independent lock+dict
+# shards so unrelated senders never contend on one global mutex.
+SESSION_SHARD_COUNT = 16
+
+
+class SessionClosedError(Exception):
+    """Raised into pending asks when their session's process is gone."""
+
+
+@dataclass
+class _PendingAsk:
+    prompt: str
+    timeout_seconds: int
+    future: "Future[str]" = field(default_factory=Future)
+
 
 @dataclass
 class ClaudeSession:
     session_key: str
     process: subprocess.Popen
-    lock: threading.Lock = field(default_factory=threading.Lock)
+    selector: selectors.BaseSelector
+    requests: "queue.Queue[Optional[_PendingAsk]]" = field(default_factory=queue.Queue)
+    worker: Optional[threading.Thread] = None
     last_used: float = field(default_factory=time.time)
 
 
@@ -27,143 +53,329 @@ class ClaudeAdapter:
         command: Optional[List[str]] = None,
         idle_timeout_seconds: int = 900,
         cleanup_interval_seconds: int = 30,
+        output_sentinel: Optional[str] = None,
+        warm_pool_size: int = 0,
     ) -> None:
         self._command = command or ["claude"]
         self._idle_timeout_seconds = idle_timeout_seconds
         self._cleanup_interval_seconds = cleanup_interval_seconds
-        self._sessions: Dict[str, ClaudeSession] = {}
-        self._sessions_lock = threading.Lock()
+        self._output_sentinel = output_sentinel or None
+        self._session_shards: List[Dict[str, ClaudeSession]] = [
+            {} for _ in range(SESSION_SHARD_COUNT)
+        ]
+        self._shard_locks: List[threading.Lock] = [
+            threading.Lock() for _ in range(SESSION_SHARD_COUNT)
+        ]
+        # Min-heap of (expiry, session_key) so the cleanup pass only touches
+        # sessions whose deadline has passed instead of scanning every shard.
+        # Entries are lazy: activity is re-checked on pop and fresh sessions
+        # are rescheduled for their new deadline.
+        self._expiry_heap: List[Tuple[float, str]] = []
+        self._expiry_lock = threading.Lock()
+        # Set whenever a pushed entry becomes the new earliest deadline, so
+        # the cleanup worker re-plans its sleep instead of overshooting.
+        self._expiry_wakeup = threading.Event()
         self._shutdown_event = threading.Event()
+        # Pre-spawned idle processes so a first ask() for a new sender does
+        # not pay CLI startup latency; a background thread keeps the pool
+        # topped up as sessions consume from it.
+        self._warm_pool_size = max(0, warm_pool_size)
+        self._warm_processes: "queue.Queue[subprocess.Popen]" = queue.Queue()
+        self._warm_thread: Optional[threading.Thread] = None
+        if self._warm_pool_size:
+            self._warm_thread = threading.Thread(target=self._warm_pool_worker, daemon=True)
+            self._warm_thread.start()
         self._cleanup_thread = threading.Thread(target=self._cleanup_worker, daemon=True)
         self._cleanup_thread.start()
 
     def ask(self, session_key: str, prompt: str, timeout_seconds: int = 30) -> str:
         while True:
             session = self._get_or_create_session(session_key)
-            with session.lock:
-                if session.process.poll() is not None:
-                    LOGGER.info("Claude process exited, recreating", extra={"session_key": session_key})
-                    self._replace_session(session_key)
+            pending = _PendingAsk(prompt=prompt, timeout_seconds=timeout_seconds)
+            lock, shard = self._shard_for(session_key)
+            with lock:
+                # Re-validate under the shard lock: the idle cleaner may have
+                # disposed this session between lookup and enqueue, and its
+                # worker drains the queue only up to the shutdown marker.
+                if shard.get(session_key) is not session:
                     continue
+                session.requests.put(pending)
+                queue_depth = session.requests.qsize()
+            # Bound the wait by the worst case for our queue position plus
+            # slack, so any residual disposal race recreates the session
+            # instead of wedging the calling thread forever.
+            wait_seconds = queue_depth * timeout_seconds + 5
+            try:
+                return pending.future.result(timeout=wait_seconds)
+            except SessionClosedError:
+                LOGGER.info("Claude process exited, recreating", extra={"session_key": session_key})
+                self._replace_session(session_key)
+                continue
+            except FutureTimeoutError:
+                LOGGER.warning(
+                    "Claude ask exceeded its wait bound, recreating session",
+                    extra={"session_key": session_key, "wait_seconds": wait_seconds},
+                )
+                self._replace_session(session_key)
+                continue
+
+    def _session_worker(self, session: ClaudeSession) -> None:
+        """Owns the session's pipe: serves queued asks strictly in FIFO order.
 
-                session.last_used = time.time()
+        Callers never block on a lock across subprocess I/O; they queue a
+        request and wait on its future, so the handoff is the only shared
+        critical section.
+        """
+        while True:
+            pending = session.requests.get()
+            if pending is None:
+                break
+            if session.process.poll() is not None:
+                pending.future.set_exception(SessionClosedError(session.session_key))
+                continue
+            session.last_used = time.time()
+            try:
                 assert session.process.stdin is not None
-                assert session.process.stdout is not None
+                session.process.stdin.write((pending.prompt + "\n").encode("utf-8"))
+                output = self._read_response(session, pending.timeout_seconds)
+            except Exception as exc:  # surface pipe errors to the requester
+                pending.future.set_exception(exc)
+                continue
+            session.last_used = time.time()
+            pending.future.set_result(output.strip() or "(no response)")
+        self._fail_pending(session)
 
-                session.process.stdin.write(prompt + "\n")
-                session.process.stdin.flush()
-                output = self._read_response(session.process, timeout_seconds)
-                session.last_used = time.time()
-                return output.strip() or "(no response)"
+    @staticmethod
+    def _fail_pending(session: ClaudeSession) -> None:
+        while True:
+            try:
+                pending = session.requests.get_nowait()
+            except queue.Empty:
+                return
+            if pending is not None:
+                pending.future.set_exception(SessionClosedError(session.session_key))
 
     def close(self) -> None:
         self._shutdown_event.set()
+        self._expiry_wakeup.set()
         self._cleanup_thread.join(timeout=2)
-        with self._sessions_lock:
-            keys = list(self._sessions.keys())
-        for key in keys:
-            self._terminate_session(key)
+        if self._warm_thread is not None:
+            self._warm_thread.join(timeout=2)
+        while True:
+            try:
+                process = self._warm_processes.get_nowait()
+            except queue.Empty:
+                break
+            self._terminate_process(process)
+        for lock, shard in zip(self._shard_locks, self._session_shards):
+            with lock:
+                keys = list(shard.keys())
+            for key in keys:
+                self._terminate_session(key)
+
+    def _shard_for(self, session_key: str) -> Tuple[threading.Lock, Dict[str, ClaudeSession]]:
+        index = hash(session_key) % SESSION_SHARD_COUNT
+        return self._shard_locks[index], self._session_shards[index]
 
     def _get_or_create_session(self, session_key: str) -> ClaudeSession:
-        with self._sessions_lock:
-            session = self._sessions.get(session_key)
+        lock, shard = self._shard_for(session_key)
+        with lock:
+            session = shard.get(session_key)
             if session and session.process.poll() is None:
                 return session
             if session:
-                self._terminate_process(session.process)
-            session = ClaudeSession(session_key=session_key, process=self._spawn_process())
-            self._sessions[session_key] = session
-            return session
+                self._dispose_session(session)
+            session = self._create_session(session_key)
+            shard[session_key] = session
+        self._schedule_expiry(session_key, session.last_used + self._idle_timeout_seconds)
+        return session
 
     def _replace_session(self, session_key: str) -> ClaudeSession:
-        with self._sessions_lock:
-            existing = self._sessions.get(session_key)
+        lock, shard = self._shard_for(session_key)
+        with lock:
+            existing = shard.get(session_key)
             if existing:
-                self._terminate_process(existing.process)
-            session = ClaudeSession(session_key=session_key, process=self._spawn_process())
-            self._sessions[session_key] = session
-            return session
+                self._dispose_session(existing)
+            session = self._create_session(session_key)
+            shard[session_key] = session
+        # The key's existing heap entry still covers the new session; its
+        # deadline is refreshed lazily when that entry pops.
+        return session
+
+    def _schedule_expiry(self, session_key: str, expiry: float) -> None:
+        with self._expiry_lock:
+            wake = not self._expiry_heap or expiry < self._expiry_heap[0][0]
+            heapq.heappush(self._expiry_heap, (expiry, session_key))
+        if wake:
+            self._expiry_wakeup.set()
+
+    def _warm_pool_worker(self) -> None:
+        while not self._shutdown_event.is_set():
+            while self._warm_processes.qsize() < self._warm_pool_size:
+                try:
+                    self._warm_processes.put(self._spawn_process())
+                except Exception:
+                    # A failed spawn (missing CLI, transient fork error) must
+                    # not kill the refill thread; try again on the next tick.
+                    LOGGER.exception("Failed to pre-spawn warm Claude process, will retry")
+                    break
+            self._shutdown_event.wait(1)
+
+    def _take_process(self) -> subprocess.Popen:
+        """Prefer a warm pre-spawned process; spawn inline as a fallback."""
+        while True:
+            try:
+                process = self._warm_processes.get_nowait()
+            except queue.Empty:
+                return self._spawn_process()
+            if process.poll() is None:
+                return process
+            # A warm process died while parked; discard it and try the next.
+            self._terminate_process(process)
+
+    def _create_session(self, session_key: str) -> ClaudeSession:
+        process = self._take_process()
+        assert process.stdout is not None
+        stdout_fd = process.stdout.fileno()
+        flags = fcntl.fcntl(stdout_fd, fcntl.F_GETFL)
+        fcntl.fcntl(stdout_fd, fcntl.F_SETFL, flags | os.O_NONBLOCK)
+        selector = selectors.DefaultSelector()
+        selector.register(stdout_fd, selectors.EVENT_READ)
+        session = ClaudeSession(session_key=session_key, process=process, selector=selector)
+        session.worker = threading.Thread(target=self._session_worker, args=(session,), daemon=True)
+        session.worker.start()
+        return session
 
     def _spawn_process(self) -> subprocess.Popen:
         LOGGER.info("Starting Claude CLI process", extra={"command": self._command})
+        # Unbuffered binary pipes: reads already bypass the text layer via
+        # os.read, and bufsize=0 writes go straight to the pipe without a
+        # Python-side buffer copy or flush bookkeeping.
         return subprocess.Popen(
             self._command,
             stdin=subprocess.PIPE,
             stdout=subprocess.PIPE,
             stderr=subprocess.STDOUT,
-            text=True,
-            bufsize=1,
+            bufsize=0,
         )
 
-    def _read_response(self, process: subprocess.Popen, timeout_seconds: int) -> str:
-        assert process.stdout is not None
-        chunks: List[str] = []
-        stdout_fd = process.stdout.fileno()
-        deadline = time.time() + timeout_seconds
+    def _read_response(self, session: ClaudeSession, timeout_seconds: int) -> str:
+        # One growable buffer instead of a list of decoded chunks: bytes are
+        # appended in place and decoded exactly once on return.
+        buffer = bytearray()
+        assert session.process.stdout is not None
+        stdout_fd = session.process.stdout.fileno()
+        # Monotonic clock for the deadline: one call per wakeup, and immune
+        # to wall-clock steps mid-read.
+        deadline = time.monotonic() + timeout_seconds
         quiet_window_seconds = 0.6
+        sentinel = self._output_sentinel.encode("utf-8") if self._output_sentinel else None
+        tail_span = (len(sentinel) + 16) if sentinel else 0
 
-        while time.time() < deadline:
-            remaining = max(0.05, deadline - time.time())
-            ready, _, _ = select.select([stdout_fd], [], [], min(0.25, remaining))
-            if not ready:
-                if chunks:
+        while True:
+            now = time.monotonic()
+            if now >= deadline:
+                break
+            # With a sentinel the end of the reply is explicit, so keep waiting
+            # in short slices until it shows up. Without one, fall back to the
+            # quiet-window heuristic: once output has arrived, a single quiet
+            # wait decides that the reply is complete.
+            if sentinel or not buffer:
+                wait = min(0.25, deadline - now)
+            else:
+                wait = min(quiet_window_seconds, deadline - now)
+            if not session.selector.select(wait):
+                if buffer and not sentinel:
                     break
                 continue
-            raw = os.read(stdout_fd, 4096)
-            if not raw:
-                break
-            chunks.append(raw.decode("utf-8", errors="replace"))
-            quiet_deadline = time.time() + quiet_window_seconds
-            while time.time() < quiet_deadline:
-                ready, _, _ = select.select([stdout_fd], [], [], 0.1)
-                if not ready:
-                    continue
-                extra_raw = os.read(stdout_fd, 4096)
-                if not extra_raw:
+            saw_eof = False
+            while True:
+                try:
+                    raw = os.read(stdout_fd, READ_CHUNK_SIZE)
+                except BlockingIOError:
+                    break
+                if not raw:
+                    saw_eof = True
                     break
-                chunks.append(extra_raw.decode("utf-8", errors="replace"))
-        return "".join(chunks)
+                buffer += raw
+            # Only the buffer tail is examined for the sentinel, so the check
+            # stays O(sentinel) however large the reply grows.
+            if sentinel and buffer[-tail_span:].rstrip().endswith(sentinel):
+                trimmed = buffer.rstrip()
+                del trimmed[-len(sentinel):]
+                return trimmed.decode("utf-8", errors="replace")
+            if saw_eof:
+                break
+        return buffer.decode("utf-8", errors="replace")
 
     def _cleanup_worker(self) -> None:
-        while not self._shutdown_event.wait(self._cleanup_interval_seconds):
+        while not self._shutdown_event.is_set():
+            # Sleep until the earliest scheduled deadline rather than a fixed
+            # tick, so wakeups scale with expirations, not wall time. A push
+            # that becomes the new head (including the first entry into an
+            # empty heap) sets the wakeup event, cutting the sleep short so
+            # the new deadline is re-planned.
+            with self._expiry_lock:
+                if self._expiry_heap:
+                    wait = self._expiry_heap[0][0] - time.time()
+                else:
+                    wait = self._cleanup_interval_seconds
+            if wait > 0:
+                self._expiry_wakeup.wait(wait)
+            self._expiry_wakeup.clear()
+            if self._shutdown_event.is_set():
+                return
             now = time.time()
-            stale: List[str] = []
-            with self._sessions_lock:
-                for session_key, session in self._sessions.items():
-                    if (now - session.last_used) > self._idle_timeout_seconds:
-                        stale.append(session_key)
-            for session_key in stale:
+            while True:
+                with self._expiry_lock:
+                    if not self._expiry_heap or self._expiry_heap[0][0] > now:
+                        break
+                    _, session_key = heapq.heappop(self._expiry_heap)
                 self._terminate_session_if_idle(session_key)
+                # Still registered means the session saw activity since the
+                # entry was pushed (or is mid-request): schedule its next check.
+                lock, shard = self._shard_for(session_key)
+                with lock:
+                    session = shard.get(session_key)
+                if session is not None:
+                    next_expiry = session.last_used + self._idle_timeout_seconds
+                    if next_expiry <= now:
+                        # Past-due but busy (mid-request): re-check after the
+                        # interval instead of spinning on an expired deadline.
+                        next_expiry = now + self._cleanup_interval_seconds
+                    self._schedule_expiry(session_key, next_expiry)
 
     def _terminate_session_if_idle(self, session_key: str) -> None:
-        with self._sessions_lock:
-            session = self._sessions.get(session_key)
-        if not session:
-            return
-
         should_terminate = False
-        with session.lock:
-            with self._sessions_lock:
-                current = self._sessions.get(session_key)
-            if current is not session:
+        lock, shard = self._shard_for(session_key)
+        with lock:
+            session = shard.get(session_key)
+            if not session:
+                return
+            if not session.requests.empty():
                 return
             if (time.time() - session.last_used) <= self._idle_timeout_seconds:
                 return
             LOGGER.info("Cleaning up idle Claude session", extra={"session_key": session_key})
-            with self._sessions_lock:
-                if self._sessions.get(session_key) is session:
-                    self._sessions.pop(session_key, None)
-                    should_terminate = True
+            shard.pop(session_key, None)
+            should_terminate = True
 
         if should_terminate:
-            self._terminate_process(session.process)
+            self._dispose_session(session)
 
     def _terminate_session(self, session_key: str) -> None:
-        with self._sessions_lock:
-            session = self._sessions.pop(session_key, None)
+        lock, shard = self._shard_for(session_key)
+        with lock:
+            session = shard.pop(session_key, None)
         if session:
-            with session.lock:
-                self._terminate_process(session.process)
+            self._dispose_session(session)
+
+    def _dispose_session(self, session: ClaudeSession) -> None:
+        session.requests.put(None)
+        if session.worker is not None:
+            session.worker.join(timeout=2)
+        session.selector.close()
+        self._terminate_process(session.process)
 
     @staticmethod
     def _terminate_process(process: subprocess.Popen) -> None:
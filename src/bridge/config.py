@@ -1,6 +1,6 @@
 import os
 from dataclasses import dataclass
-from typing import List
+from typing import List, Optional, Tuple
 
 try:
     from dotenv import load_dotenv
@@ -9,6 +9,19 @@ except ModuleNotFoundError:  # pragma: no cover - fallback for minimal environme
         return False
 
 
+# Required-value checks as data so validation is one pass over a constant
+# tuple instead of a chain of if-statements.
+_REQUIRED_FIELD_MESSAGES: Tuple[Tuple[str, str], ...] = (
+    ("qq_app_id", "QQ_APP_ID is required."),
+    ("qq_app_secret", "QQ_APP_SECRET is required."),
+    ("qq_bot_token", "QQ_BOT_TOKEN is required when using Bot token mode."),
+    ("qq_api_base_url", "QQ_API_BASE_URL cannot be empty."),
+    ("claude_cmd", "CLAUDE_CMD must include a command to execute."),
+)
+
+_cached_config: Optional["BridgeConfig"] = None
+
+
 @dataclass(frozen=True)
 class BridgeConfig:
     qq_app_id: str
@@ -17,10 +30,22 @@ class BridgeConfig:
     qq_callback_secret: str
     qq_api_base_url: str
     claude_cmd: List[str]
+    claude_output_sentinel: str
+    claude_warm_pool_size: int
     session_timeout_seconds: int
 
     @classmethod
-    def from_env(cls) -> "BridgeConfig":
+    def from_env(cls, refresh: bool = False) -> "BridgeConfig":
+        """Load and validate config from the environment.
+
+        The environment does not change while the service runs, so the
+        parsed result is cached after the first call; pass ``refresh=True``
+        to force a re-read (e.g. in tests that mutate os.environ).
+        """
+        global _cached_config
+        if _cached_config is not None and not refresh:
+            return _cached_config
+
         load_dotenv()
 
         qq_app_id = (os.getenv("QQ_APP_ID") or os.getenv("QQ_BOT_APP_ID") or "").strip()
@@ -31,6 +56,9 @@ class BridgeConfig:
 
         claude_cmd_raw = (os.getenv("CLAUDE_CMD") or os.getenv("CLAUDE_COMMAND") or "claude").strip()
         claude_cmd = claude_cmd_raw.split()
+        claude_output_sentinel = (os.getenv("CLAUDE_OUTPUT_SENTINEL") or "").strip()
+
+        warm_pool_raw = (os.getenv("CLAUDE_WARM_POOL_SIZE") or "2").strip()
 
         session_timeout_raw = (
             os.getenv("SESSION_TIMEOUT_SECONDS")
@@ -38,17 +66,16 @@ class BridgeConfig:
             or "1800"
         ).strip()
 
-        errors: List[str] = []
-        if not qq_app_id:
-            errors.append("QQ_APP_ID is required.")
-        if not qq_app_secret:
-            errors.append("QQ_APP_SECRET is required.")
-        if not qq_bot_token:
-            errors.append("QQ_BOT_TOKEN is required when using Bot token mode.")
-        if not qq_api_base_url:
-            errors.append("QQ_API_BASE_URL cannot be empty.")
-        if not claude_cmd:
-            errors.append("CLAUDE_CMD must include a command to execute.")
+        values = {
+            "qq_app_id": qq_app_id,
+            "qq_app_secret": qq_app_secret,
+            "qq_bot_token": qq_bot_token,
+            "qq_api_base_url": qq_api_base_url,
+            "claude_cmd": claude_cmd,
+        }
+        errors: List[str] = [
+            message for field_name, message in _REQUIRED_FIELD_MESSAGES if not values[field_name]
+        ]
 
         session_timeout_seconds = 0
         try:
@@ -58,16 +85,27 @@ class BridgeConfig:
         except ValueError:
             errors.append("SESSION_TIMEOUT_SECONDS must be a positive integer.")
 
+        claude_warm_pool_size = 0
+        try:
+            claude_warm_pool_size = int(warm_pool_raw)
+            if claude_warm_pool_size < 0:
+                raise ValueError
+        except ValueError:
+            errors.append("CLAUDE_WARM_POOL_SIZE must be a non-negative integer.")
+
         if errors:
             joined = "\n- ".join(errors)
             raise ValueError(f"Configuration validation failed:\n- {joined}")
 
-        return cls(
+        _cached_config = cls(
             qq_app_id=qq_app_id,
             qq_app_secret=qq_app_secret,
             qq_bot_token=qq_bot_token,
             qq_callback_secret=qq_callback_secret,
             qq_api_base_url=qq_api_base_url,
             claude_cmd=claude_cmd,
+            claude_output_sentinel=claude_output_sentinel,
+            claude_warm_pool_size=claude_warm_pool_size,
             session_timeout_seconds=session_timeout_seconds,
         )
+        return _cached_config
@@ -0,0 +1,28 @@
+"""JSON encode/decode helpers that prefer orjson when it is installed.
+
+orjson serializes straight to bytes several times faster than the stdlib
+encoder, which matters on the per-event webhook and send paths. The stdlib
+json module remains the fallback so minimal environments keep working.
+"""
+
+import json
+from typing import Any, Union
+
+try:
+    import orjson
+except ModuleNotFoundError:  # pragma: no cover - fallback for minimal environments
+    orjson = None  # type: ignore[assignment]
+
+
+if orjson is not None:
+    def dumps_bytes(obj: Any) -> bytes:
+        return orjson.dumps(obj)
+
+    def loads(data: Union[bytes, str]) -> Any:
+        return orjson.loads(data)
+else:
+    def dumps_bytes(obj: Any) -> bytes:
+        return json.dumps(obj).encode("utf-8")
+
+    def loads(data: Union[bytes, str]) -> Any:
+        return json.loads(data)
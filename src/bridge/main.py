@@ -1,10 +1,11 @@
-import json
 import logging
 import os
+from concurrent.futures import Future, ThreadPoolExecutor
 from http import HTTPStatus
 from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
 from typing import Any, Dict, Optional
 
+from . import jsonutil
 from .claude_adapter import ClaudeAdapter
 from .config import BridgeConfig
 from .qq_adapter import QQAdapter
@@ -19,6 +20,24 @@ def configure_logging() -> None:
 
 LOGGER = logging.getLogger(__name__)
 
+# Pre-built head for the common 200 reply; only Content-Length varies, so one
+# format_map plus a single wfile.write replaces the send_response /
+# send_header / end_headers call chain and its per-header socket writes.
+_OK_RESPONSE_HEAD = (
+    "HTTP/1.1 200 OK\r\n"
+    "Content-Type: application/json\r\n"
+    "Content-Length: {length}\r\n"
+    "\r\n"
+)
+
+# Webhook acknowledgements are identical for every event, so the complete
+# head+body reply is a pre-encoded constant written in one call.
+_ACCEPTED_BODY = b'{"status":"accepted"}'
+_ACCEPTED_RESPONSE = (
+    _OK_RESPONSE_HEAD.format_map({"length": len(_ACCEPTED_BODY)}).encode("latin-1")
+    + _ACCEPTED_BODY
+)
+
 
 class BridgeService:
     """Coordinates QQ event ingestion with per-user Claude sessions."""
@@ -26,6 +45,29 @@ class BridgeService:
     def __init__(self, qq_adapter: QQAdapter, claude_adapter: ClaudeAdapter) -> None:
         self.qq_adapter = qq_adapter
         self.claude_adapter = claude_adapter
+        self._executor = ThreadPoolExecutor(max_workers=8, thread_name_prefix="bridge-event")
+
+    def submit_event(self, payload: Dict[str, Any]) -> None:
+        """Queue an event for background processing; outcome is logged."""
+        future = self._executor.submit(self.handle_incoming_event, payload)
+        future.add_done_callback(self._log_event_outcome)
+
+    @staticmethod
+    def _log_event_outcome(future: "Future[Dict[str, Any]]") -> None:
+        try:
+            result = future.result()
+        except Exception:
+            LOGGER.exception("Event processing failed")
+        else:
+            LOGGER.info(
+                "Event processing finished",
+                extra={"result_status": result.get("status"), "event_id": result.get("event_id")},
+            )
+
+    def close(self) -> None:
+        self._executor.shutdown(wait=True)
+        self.claude_adapter.close()
+        self.qq_adapter.close()
 
     def handle_incoming_event(self, payload: Dict[str, Any]) -> Dict[str, Any]:
         event = self.qq_adapter.parse_event(payload)
@@ -38,7 +80,10 @@ class BridgeService:
             )
             return {"status": "ignored", "reason": "self_message", "event_id": event.event_id}
 
-        if not event.sender_id or not event.text.strip():
+        # isspace() rejects blank messages without allocating the stripped
+        # copy; only messages that will actually be forwarded pay the strip.
+        text = event.text
+        if not event.sender_id or not text or text.isspace():
             return {"status": "ignored", "reason": "empty_sender_or_text", "event_id": event.event_id}
 
         session_key = event.sender_id
@@ -47,7 +92,7 @@ class BridgeService:
             extra={"event_id": event.event_id, "session_key": session_key},
         )
 
-        claude_response = self.claude_adapter.ask(session_key, event.text)
+        claude_response = self.claude_adapter.ask(session_key, text.strip())
         status_code, response_payload = self.qq_adapter.send_message(event, claude_response)
 
         return {
@@ -59,9 +104,23 @@ class BridgeService:
         }
 
 
+class BridgeHTTPServer(ThreadingHTTPServer):
+    """ThreadingHTTPServer tuned for small-payload webhook traffic."""
+
+    # Accept backlog sized for webhook bursts instead of the default 5.
+    request_queue_size = 128
+    # Flush small JSON responses immediately rather than waiting on Nagle.
+    disable_nagle_algorithm = True
+
+
 class BridgeRequestHandler(BaseHTTPRequestHandler):
     service: Optional[BridgeService] = None
 
+    # HTTP/1.1 keeps the webhook connection alive across events, so repeat
+    # deliveries skip the TCP handshake (responses always carry
+    # Content-Length, which persistent connections require).
+    protocol_version = "HTTP/1.1"
+
     def do_POST(self) -> None:
         if self.path != "/qq/webhook":
             self.send_error(HTTPStatus.NOT_FOUND, "Unknown path")
@@ -71,8 +130,8 @@ class BridgeRequestHandler(BaseHTTPRequestHandler):
         raw = self.rfile.read(content_length)
 
         try:
-            payload = json.loads(raw.decode("utf-8"))
-        except json.JSONDecodeError:
+            payload = jsonutil.loads(raw)
+        except ValueError:
             self.send_error(HTTPStatus.BAD_REQUEST, "Invalid JSON payload")
             return
 
@@ -80,17 +139,21 @@ class BridgeRequestHandler(BaseHTTPRequestHandler):
             self.send_error(HTTPStatus.INTERNAL_SERVER_ERROR, "Service not initialized")
             return
 
-        response_data = self.service.handle_incoming_event(payload)
-        response_bytes = json.dumps(response_data).encode("utf-8")
+        # Ack as soon as the payload parses; the Claude round-trip and QQ
+        # send happen on the service executor so QQ's delivery timeout never
+        # races a slow model reply.
+        self.service.submit_event(payload)
 
-        self.send_response(HTTPStatus.OK)
-        self.send_header("Content-Type", "application/json")
-        self.send_header("Content-Length", str(len(response_bytes)))
-        self.end_headers()
-        self.wfile.write(response_bytes)
+        # Write the reply before logging: the ack must reach the client even
+        # if logging misbehaves, and the event is already queued at this point.
+        self.close_connection = False
+        self.wfile.write(_ACCEPTED_RESPONSE)
+        self.log_request(HTTPStatus.OK)
 
     def log_message(self, fmt: str, *args: Any) -> None:
-        LOGGER.info("HTTP request", extra={"message": fmt % args})
+        # "message" is reserved on LogRecord; using it in extra raises
+        # KeyError and kills the handler thread once INFO logging is on.
+        LOGGER.info("HTTP request", extra={"http_message": fmt % args})
 
 
 def build_service() -> BridgeService:
@@ -104,6 +167,8 @@ def build_service() -> BridgeService:
     claude_adapter = ClaudeAdapter(
         command=config.claude_cmd,
         idle_timeout_seconds=config.session_timeout_seconds,
+        output_sentinel=config.claude_output_sentinel,
+        warm_pool_size=config.claude_warm_pool_size,
     )
     return BridgeService(qq_adapter=qq_adapter, claude_adapter=claude_adapter)
 
@@ -120,7 +185,7 @@ def run() -> None:
         raise SystemExit(1) from exc
     BridgeRequestHandler.service = service
 
-    server = ThreadingHTTPServer((host, port), BridgeRequestHandler)
+    server = BridgeHTTPServer((host, port), BridgeRequestHandler)
     LOGGER.info("Bridge server started", extra={"host": host, "port": port})
 
     try:
@@ -128,7 +193,7 @@ def run() -> None:
     except KeyboardInterrupt:
         LOGGER.info("Bridge server stopping")
     finally:
-        service.claude_adapter.close()
+        service.close()
         server.server_close()
 
 
@@ -1,13 +1,40 @@
-import json
 import logging
+import queue
+import threading
+import time
 import urllib.error
 import urllib.request
-from dataclasses import dataclass
-from typing import Any, Dict, Optional, Tuple
+from collections import deque
+from concurrent.futures import Future
+from dataclasses import dataclass, field
+from typing import Any, Deque, Dict, List, Optional, Tuple
+
+try:
+    import httpx
+except ModuleNotFoundError:  # pragma: no cover - fallback for minimal environments
+    httpx = None  # type: ignore[assignment]
+
+try:
+    import urllib3
+except ModuleNotFoundError:  # pragma: no cover - fallback for minimal environments
+    urllib3 = None  # type: ignore[assignment]
+
+from . import jsonutil
 
 
 LOGGER = logging.getLogger(__name__)
 
+# Bounds for the adaptive outbound flush window: shrink towards the floor
+# while sends are fast, grow towards the cap when latencies suggest the
+# upstream is saturated and batching pays off.
+MIN_BATCH_WINDOW_SECONDS = 0.005
+
+# Shared fallback for absent author/sender blocks so parse_event does not
+# allocate two throwaway dicts per event. Read-only by convention.
+_EMPTY_DICT: Dict[str, Any] = {}
+SLOW_SEND_THRESHOLD_SECONDS = 0.25
+FAST_SEND_THRESHOLD_SECONDS = 0.1
+
 
 @dataclass
 class QQMessageEvent:
@@ -20,19 +47,78 @@ class QQMessageEvent:
     raw_payload: Dict[str, Any]
 
 
+@dataclass
+class _OutboundMessage:
+    path: str
+    content: str
+    future: "Future[Tuple[int, str]]" = field(default_factory=Future)
+
+
 class QQAdapter:
     """Tencent QQ adapter for ingesting events and sending responses."""
 
-    def __init__(self, bot_account_id: str, bot_token: str, api_base_url: str, timeout_seconds: int = 10) -> None:
+    def __init__(
+        self,
+        bot_account_id: str,
+        bot_token: str,
+        api_base_url: str,
+        timeout_seconds: int = 10,
+        max_batch_window_ms: int = 50,
+    ) -> None:
         self.bot_account_id = bot_account_id
         self.bot_token = bot_token
         self.api_base_url = api_base_url.rstrip("/")
         self.timeout_seconds = timeout_seconds
+        # Normalized once so every parse_event comparison is str == str
+        # without re-stringifying the account ID per event.
+        self._bot_account_id_str = str(bot_account_id)
+        # Credentials never change after construction, so the request headers
+        # are built once instead of re-formatted on every POST.
+        self._request_headers = {
+            "Content-Type": "application/json",
+            "Authorization": f"Bot {bot_account_id}.{bot_token}",
+        }
+        self._max_batch_window_seconds = max_batch_window_ms / 1000.0
+        self._batch_window_seconds = MIN_BATCH_WINDOW_SECONDS
+        self._recent_send_latencies: Deque[float] = deque(maxlen=20)
+        # One long-lived client per adapter, preferred in order of what the
+        # environment offers: httpx (HTTP/2 multiplexing, so concurrent sends
+        # share one connection), then a urllib3 keep-alive pool, then plain
+        # urllib as the last resort.
+        self._client = None
+        if httpx is not None:
+            try:
+                self._client = httpx.Client(
+                    base_url=self.api_base_url,
+                    http2=True,
+                    timeout=timeout_seconds,
+                    limits=httpx.Limits(max_connections=16),
+                )
+            except ImportError:  # http2 extra (h2) not installed
+                self._client = httpx.Client(
+                    base_url=self.api_base_url,
+                    timeout=timeout_seconds,
+                    limits=httpx.Limits(max_connections=16),
+                )
+        self._pool = None
+        if urllib3 is not None:
+            self._pool = urllib3.connectionpool.connection_from_url(
+                self.api_base_url, maxsize=16, block=False
+            )
+        self._outbound_q: "queue.Queue[Optional[_OutboundMessage]]" = queue.Queue()
+        self._sender_thread = threading.Thread(target=self._sender_worker, daemon=True)
+        self._sender_thread.start()
+
+    def close(self) -> None:
+        self._outbound_q.put(None)
+        self._sender_thread.join(timeout=self.timeout_seconds)
+        if self._client is not None:
+            self._client.close()
 
     def parse_event(self, payload: Dict[str, Any]) -> QQMessageEvent:
         data = payload.get("d", payload)
-        author = data.get("author") or {}
-        sender = data.get("sender") or {}
+        author = data.get("author") or _EMPTY_DICT
+        sender = data.get("sender") or _EMPTY_DICT
 
         sender_id = str(
             author.get("id")
@@ -49,8 +135,8 @@ class QQAdapter:
         is_bot_tagged = bool(author.get("bot") or sender.get("bot"))
         source_bot_id = str(payload.get("bot_appid") or payload.get("self_id") or data.get("self_id") or "")
         is_self_message = (
-            sender_id == str(self.bot_account_id)
-            or source_bot_id == str(self.bot_account_id)
+            sender_id == self._bot_account_id_str
+            or source_bot_id == self._bot_account_id_str
             or is_bot_tagged
         )
 
@@ -65,7 +151,6 @@ class QQAdapter:
         )
 
     def send_message(self, event: QQMessageEvent, content: str) -> Tuple[int, str]:
-        body: Dict[str, Any] = {"content": content}
         if event.channel_id:
             path = f"/channels/{event.channel_id}/messages"
         elif event.group_id:
@@ -73,7 +158,9 @@ class QQAdapter:
         else:
             path = f"/v2/users/{event.sender_id}/messages"
 
-        status, payload = self._post_json(path, body)
+        message = _OutboundMessage(path=path, content=content)
+        self._outbound_q.put(message)
+        status, payload = message.future.result()
         LOGGER.info(
             "Outgoing QQ message request finished",
             extra={
@@ -84,16 +171,95 @@ class QQAdapter:
         )
         return status, payload
 
+    def _sender_worker(self) -> None:
+        """Coalesces outbound messages over a short, self-tuning window."""
+        while True:
+            message = self._outbound_q.get()
+            if message is None:
+                return
+            batch = [message]
+            window_deadline = time.monotonic() + self._batch_window_seconds
+            shutting_down = False
+            while True:
+                remaining = window_deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                try:
+                    next_message = self._outbound_q.get(timeout=remaining)
+                except queue.Empty:
+                    break
+                if next_message is None:
+                    shutting_down = True
+                    break
+                batch.append(next_message)
+            self._flush_batch(batch)
+            if shutting_down:
+                return
+
+    def _flush_batch(self, batch: List[_OutboundMessage]) -> None:
+        # Adjacent messages bound for the same destination share one POST,
+        # with their contents joined; every coalesced caller gets the same
+        # status/payload back.
+        index = 0
+        while index < len(batch):
+            run_end = index + 1
+            while run_end < len(batch) and batch[run_end].path == batch[index].path:
+                run_end += 1
+            run = batch[index:run_end]
+            body: Dict[str, Any] = {"content": "\n".join(item.content for item in run)}
+            started = time.monotonic()
+            try:
+                result = self._post_json(run[0].path, body)
+            except Exception as exc:  # pragma: no cover - defensive, _post_json catches URL errors
+                for item in run:
+                    item.future.set_exception(exc)
+            else:
+                self._tune_batch_window(time.monotonic() - started)
+                for item in run:
+                    item.future.set_result(result)
+            index = run_end
+
+    def _tune_batch_window(self, send_latency: float) -> None:
+        self._recent_send_latencies.append(send_latency)
+        ordered = sorted(self._recent_send_latencies)
+        p50 = ordered[len(ordered) // 2]
+        if p50 > SLOW_SEND_THRESHOLD_SECONDS:
+            self._batch_window_seconds = min(self._batch_window_seconds * 2, self._max_batch_window_seconds)
+        elif p50 < FAST_SEND_THRESHOLD_SECONDS:
+            self._batch_window_seconds = max(self._batch_window_seconds / 2, MIN_BATCH_WINDOW_SECONDS)
+
     def _post_json(self, path: str, body: Dict[str, Any]) -> Tuple[int, str]:
-        encoded_body = json.dumps(body).encode("utf-8")
+        encoded_body = jsonutil.dumps_bytes(body)
+        headers = self._request_headers
+
+        if self._client is not None:
+            try:
+                response = self._client.post(path, content=encoded_body, headers=headers)
+                return response.status_code, response.text
+            except httpx.HTTPError as exc:
+                LOGGER.error("QQ API request failed", extra={"error": str(exc), "path": path})
+                return 0, str(exc)
+
+        if self._pool is not None:
+            try:
+                response = self._pool.request(
+                    "POST",
+                    path,
+                    body=encoded_body,
+                    headers=headers,
+                    timeout=self.timeout_seconds,
+                    retries=False,
+                )
+                return response.status, response.data.decode("utf-8", errors="replace")
+            except urllib3.exceptions.HTTPError as exc:
+                LOGGER.error("QQ API request failed", extra={"error": str(exc), "path": path})
+                return 0, str(exc)
+
         req = urllib.request.Request(
             url=f"{self.api_base_url}{path}",
             method="POST",
             data=encoded_body,
-            headers={
-                "Content-Type": "application/json",
-                "Authorization": f"Bot {self.bot_account_id}.{self.bot_token}",
-            },
+            headers=headers,
         )
         try:
             with urllib.request.urlopen(req, timeout=self.timeout_seconds) as response: